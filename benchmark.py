@@ -0,0 +1,74 @@
+## Benchmark for the search and view pipeline ##
+# usage: python benchmark.py [number of memories]   (100000 by default)
+# builds a throwaway database in a temp folder, whatever the CLI functions print is discarded.
+# reports wall time and peak python memory (tracemalloc) per step, in plaintext mode and then encrypted.
+
+import sys
+import os
+import io
+import time
+import random
+import tempfile
+import tracemalloc
+import contextlib
+
+import typyfy
+
+WORDS = ["alice", "bob", "cat", "canteen", "rain", "train", "coffee", "exam", "beach", "birthday", "movie", "park"]
+
+def build_database(cursor, conn, memories):
+    rng = random.Random(42)
+    cursor.executemany("INSERT INTO Person (name) VALUES (?)", [(f"person{i}",) for i in range(200)])
+    cursor.executemany("INSERT INTO Tag (name) VALUES (?)", [(f"tag{i}",) for i in range(50)])
+    cursor.executemany("INSERT INTO Memory (title, content, timestamp) VALUES (?, ?, ?)", (
+        (" ".join(rng.sample(WORDS, 2)),
+         " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 200))),
+         f"{rng.randint(2000, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}")
+        for _ in range(memories)))
+    cursor.executemany("INSERT OR IGNORE INTO MemoryPerson VALUES (?, ?)", ((rng.randint(1, memories), rng.randint(1, 200)) for _ in range(memories)))
+    cursor.executemany("INSERT OR IGNORE INTO MemoryTag VALUES (?, ?)", ((rng.randint(1, memories), rng.randint(1, 50)) for _ in range(memories)))
+    conn.commit()
+
+def measure(label, func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<32} {elapsed * 1000:>9.1f} ms {peak / 1024:>10.0f} KiB peak")
+
+def measure_searches(cursor):
+    measure("search memories 'cat'", typyfy.search_memories, cursor, ["cat"], 10)
+    measure("search memories 'cat, rain'", typyfy.search_memories, cursor, ["cat", "rain"], 10)
+    measure("search memories 'cat' (100 rows)", typyfy.search_memories, cursor, ["cat"], 100)
+    measure("search person 'person1'", typyfy.search_person, cursor, ["person1"], 10)
+    measure("search tag 'tag1'", typyfy.search_tag, cursor, ["tag1"], 10)
+    measure("view Memory", typyfy.view_table, "memory", cursor)
+
+def main():
+    memories = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    with tempfile.TemporaryDirectory() as folder:
+        typyfy.DB_PATH = os.path.join(folder, "memory_db.sqlite")
+        conn = typyfy.connect_db()
+        cursor = conn.cursor()
+        typyfy.create_tables(cursor, conn)
+        build_database(cursor, conn, memories)
+        print(f"{memories} memories\n")
+
+        print("plaintext")
+        measure_searches(cursor)
+
+        print("\nencrypted")
+        measure("derive key (scrypt)", typyfy.derive_key, "benchmark", os.urandom(16), *typyfy.KDF_PARAMS.values())
+        measure("encrypt database", typyfy.enable_encryption, conn, "benchmark")
+        measure_searches(cursor)
+        print("\nencrypted, decrypt cache warm")
+        measure_searches(cursor)
+
+        conn.close()
+
+if __name__ == "__main__":
+    main()
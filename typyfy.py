@@ -7,9 +7,38 @@ from datetime import datetime
 import re
 from prompt_toolkit import prompt
 from prompt_toolkit.completion import WordCompleter
+from prompt_toolkit.application import Application
+from prompt_toolkit.buffer import Buffer
+from prompt_toolkit.key_binding import KeyBindings
+from prompt_toolkit.layout import Layout, HSplit, Window
+from prompt_toolkit.layout.controls import BufferControl, FormattedTextControl
 import shutil
 from wcwidth import wcswidth
-from collections import defaultdict
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.exceptions import InvalidTag
+from collections import defaultdict, Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import hashlib
+import time
+import math
+import json
+import functools
+import itertools
+import operator
+import contextlib
+import asyncio
+import io
+import mmap
+import bisect
+from array import array
+import cProfile
+import hmac
+import base64
+import getpass
+import os
+import glob
+
+DB_PATH = "memory_db.sqlite"
 
 #----------------------------------------------------# TABLE PROPERTIES ## ------------------------------------------------------------------------------------------------------------------------
 
@@ -53,6 +82,27 @@ def create_tables(cursor, conn):
         FOREIGN KEY (memory_id) REFERENCES Memory(id),
         FOREIGN KEY (tag_id) REFERENCES Tag(id)
     );
+
+    CREATE TABLE IF NOT EXISTS MemoryIndex (
+        memory_id INTEGER PRIMARY KEY,
+        content_length INTEGER,
+        signature TEXT,
+        FOREIGN KEY (memory_id) REFERENCES Memory(id)
+    );
+
+    CREATE TABLE IF NOT EXISTS MemoryToken (
+        token BLOB NOT NULL,
+        memory_id INTEGER NOT NULL,
+        PRIMARY KEY (token, memory_id),
+        FOREIGN KEY (memory_id) REFERENCES Memory(id)
+    ) WITHOUT ROWID;
+
+    CREATE INDEX IF NOT EXISTS idx_memorytoken_memory ON MemoryToken(memory_id);
+
+    CREATE TABLE IF NOT EXISTS Settings (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
     """)
 
     conn.commit()
@@ -81,9 +131,517 @@ fixed_widths = {
     "content" : len("[content]"),
     "description" : None,
     "bio": None,
-    "mcount" : 6
+    "mcount" : 6,
+    "calls": 6,
+    "total ms": 9,
+    "p95 ms": 8,
+    "rows": 7
 }
 
+#----------------------------------------------------# INSTRUMENTATION ## -------------------------------------------------------------------------------------------------------------------
+
+instrumentation = None  #created by the first 'profile on', kept after 'profile off' so stats stay readable
+
+#collects per statement timings, python span timings and a cProfile run
+class Instrumentation:
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self.sql_times = defaultdict(list)
+        self.sql_rows = defaultdict(int)
+        self.traced = defaultdict(int)      #statements as sqlite actually ran them (incl. COMMIT, executescript parts)
+        self.spans = defaultdict(list)
+        self.profiler.clear()
+
+    def set_enabled(self, enabled):
+        if enabled:
+            self.profiler.enable()
+        else:
+            self.profiler.disable()
+        self.enabled = enabled
+
+    def record_sql(self, sql, elapsed, rows=0):
+        self.sql_times[sql].append(elapsed)
+        self.sql_rows[sql] += rows
+
+    #fetches run after execute, so their time and rows go to the statement that produced them
+    def record_fetch(self, sql, elapsed, rows):
+        if sql in self.sql_times:
+            self.sql_times[sql][-1] += elapsed
+            self.sql_rows[sql] += rows
+
+    #trace callback, keyed by statement kind since traced sql has the bound values expanded
+    def trace(self, statement):
+        self.traced[statement.split(None, 1)[0].upper() if statement.strip() else "?"] += 1
+
+    def record_span(self, name, elapsed):
+        self.spans[name].append(elapsed)
+
+    def sql_summary(self):
+        return [{"statement": sql, "calls": len(times), "total_ms": sum(times) * 1000,
+                 "p95_ms": percentile(times, 95) * 1000, "rows": self.sql_rows[sql]}
+                for sql, times in self.sql_times.items()]
+
+    def span_summary(self):
+        return [{"span": name, "calls": len(times), "total_ms": sum(times) * 1000,
+                 "p95_ms": percentile(times, 95) * 1000}
+                for name, times in self.spans.items()]
+
+#every timer below is a no-op unless this is true
+def recording():
+    return instrumentation is not None and instrumentation.enabled
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * pct / 100) - 1)]
+
+#one line per statement so the same query from different places groups together
+def normalize_sql(sql):
+    return " ".join(sql.split())
+
+#cursor that times execute/fetch calls when instrumentation is on
+class TimedCursor(sqlite3.Cursor):
+    _last_sql = None
+
+    def _timed(self, method, sql, *args):
+        if not recording():
+            return method(sql, *args)
+        self._last_sql = normalize_sql(sql)
+        start = time.perf_counter()
+        try:
+            return method(sql, *args)
+        finally:
+            instrumentation.record_sql(self._last_sql, time.perf_counter() - start)
+
+    def execute(self, sql, parameters=()):
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self._timed(super().executescript, sql_script)
+
+    def _fetch(self, method, *args):
+        if not recording():
+            return method(*args)
+        start = time.perf_counter()
+        result = method(*args)
+        rows = len(result) if isinstance(result, list) else int(result is not None)
+        instrumentation.record_fetch(self._last_sql, time.perf_counter() - start, rows)
+        return result
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, size if size is not None else self.arraysize)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+    #plain iteration over the cursor, counts rows only
+    def __next__(self):
+        row = super().__next__()
+        if recording():
+            instrumentation.record_fetch(self._last_sql, 0.0, 1)
+        return row
+
+#connection that hands out timed cursors and times commits (the fsync cost)
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        if not recording():
+            return super().commit()
+        start = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            instrumentation.record_sql("COMMIT", time.perf_counter() - start)
+
+    #'with conn:' commits in C without calling commit(), route it through the timed one
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.rollback()
+            return False
+        try:
+            self.commit()
+        except BaseException:
+            self.rollback()
+            raise
+        return False
+
+#span timer for python hot paths
+def timed(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not recording():
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                instrumentation.record_span(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+#every connection of the CLI goes through here, instrumented ones are opt-in
+def connect_db(instrumented=False, check_same_thread=True):
+    if instrumented:
+        conn = sqlite3.connect(f"file:{DB_PATH}", uri=True, factory=TimedConnection, check_same_thread=check_same_thread)
+        conn.set_trace_callback(instrumentation.trace)
+    else:
+        conn = sqlite3.connect(f"file:{DB_PATH}", uri=True, check_same_thread=check_same_thread)    #uri so archive volumes can be attached read-only
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+#switch instrumentation on/off, returns the (re)opened connection
+def set_profiling(conn, enabled):
+    global instrumentation
+    if not enabled and not recording():
+        print("Instrumentation is off.")
+        return conn
+    conn.commit()
+    conn.close()
+    if enabled:
+        if instrumentation is None:
+            instrumentation = Instrumentation()
+        instrumentation.set_enabled(True)
+        print("Instrumentation on. Type 'stats' to see where the time goes.")
+    else:
+        instrumentation.set_enabled(False)
+        print("Instrumentation off. Collected stats are kept until 'stats reset'.")
+    return connect_db(instrumented=enabled)
+
+#stats, stats reset, stats json [file], stats pstats [file]
+def show_stats(args, top=10):
+    if instrumentation is None:
+        print("Instrumentation is off. Type 'profile on' first.")
+        return
+
+    action, _, path = args.strip().partition(" ")
+    path = path.strip()
+
+    if action == "reset":
+        instrumentation.reset()
+        print("Stats cleared.")
+
+    elif action == "json":
+        path = path or "typyfy_stats.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"sql": instrumentation.sql_summary(), "spans": instrumentation.span_summary(),
+                       "traced": dict(instrumentation.traced)}, f, indent=2)
+        print(f"Stats written to {path}")
+
+    elif action == "pstats":
+        path = path or "typyfy.pstats"
+        try:
+            instrumentation.profiler.dump_stats(path)
+        finally:    #dumping stops the profiler (even when the write fails), so pick it back up
+            instrumentation.set_enabled(instrumentation.enabled)
+        print(f"Profile written to {path} (open with python -m pstats {path})")
+
+    elif action:
+        print("Usage: stats [reset | json FILE | pstats FILE]")
+
+    else:
+        by_total = sorted(instrumentation.sql_summary(), key=lambda s: s["total_ms"], reverse=True)[:top]
+        print(f"\nTop {top} SQL statements by total time:")
+        render_table(["calls", "total ms", "p95 ms", "rows", "statement"],
+                     [[s["calls"], f"{s['total_ms']:.2f}", f"{s['p95_ms']:.2f}", s["rows"], s["statement"]] for s in by_total],
+                     dynamic_columns={"statement"})
+
+        spans = sorted(instrumentation.span_summary(), key=lambda s: s["total_ms"], reverse=True)
+        print("\nHot paths:")
+        render_table(["span", "calls", "total ms", "p95 ms"],
+                     [[s["span"], s["calls"], f"{s['total_ms']:.2f}", f"{s['p95_ms']:.2f}"] for s in spans],
+                     dynamic_columns={"span"})
+
+        print("\nStatements run by sqlite: " + (", ".join(f"{kind} {count}" for kind, count in sorted(instrumentation.traced.items())) or "—"))
+
+#----------------------------------------------------# ENCRYPTION ## -------------------------------------------------------------------------------------------------------------------
+
+#memory titles and content can be stored encrypted (AES-GCM), names, dates, bios and descriptions stay readable
+#search goes through MemoryToken, keyed hashes of the words, so matching never needs to decrypt anything
+
+ENCRYPTED_PREFIX = "enc1:"
+KDF_PARAMS = {"n": 2 ** 15, "r": 8, "p": 1}    #scrypt cost, roughly 0.1 s and 32 MiB, paid once per session
+DECRYPT_CACHE_SIZE = 4096                       #decrypted values kept per session
+
+cipher = None   #set once the passphrase is entered, None means plaintext mode
+
+def derive_key(passphrase, salt, n, r, p):
+    return hashlib.scrypt(passphrase.encode("utf-8"), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r, dklen=64)
+
+#first half of the key material encrypts, second half keys the search tokens
+class Cipher:
+    def __init__(self, key_material):
+        self.key_material = key_material
+        self._aead = AESGCM(key_material[:32])
+        self._index_key = key_material[32:]
+        self.decrypt = functools.lru_cache(maxsize=DECRYPT_CACHE_SIZE)(self.decrypt_uncached)
+
+    #the field name is authenticated too, so a title can't be swapped in for content
+    def encrypt(self, text, field):
+        nonce = os.urandom(12)
+        sealed = self._aead.encrypt(nonce, text.encode("utf-8"), field.encode("utf-8"))
+        return ENCRYPTED_PREFIX + base64.b64encode(nonce + sealed).decode("ascii")
+
+    #None unless value really is ciphertext under this key, plaintext that merely starts with the prefix doesn't count
+    def try_decrypt(self, value, field):
+        if not isinstance(value, str) or not value.startswith(ENCRYPTED_PREFIX):
+            return None
+        try:
+            raw = base64.b64decode(value[len(ENCRYPTED_PREFIX):], validate=True)
+            return self._aead.decrypt(raw[:12], raw[12:], field.encode("utf-8")).decode("utf-8")
+        except (ValueError, InvalidTag):    #binascii.Error and UnicodeDecodeError are ValueErrors
+            return None
+
+    #plaintext values pass through untouched
+    def decrypt_uncached(self, value, field):
+        plaintext = self.try_decrypt(value, field)
+        return value if plaintext is None else plaintext
+
+    def token(self, word):
+        return hmac.new(self._index_key, word.encode("utf-8"), "sha256").digest()[:16]
+
+    #keyed digest for values derived from plaintext that get stored, like reindex signatures
+    def signature(self, data):
+        return hmac.new(self._index_key, data, "sha256").hexdigest()
+
+    def tokens(self, *texts):
+        words = {word for text in texts if text for word in re.findall(r"\w+", text.lower())}
+        return {self.token(word) for word in words}
+
+    #stored at setup so a wrong passphrase is caught before anything gets decrypted
+    def check_value(self):
+        return hmac.new(self._index_key, b"typyfy passphrase check", "sha256").hexdigest()
+
+def reveal(value, field):
+    return cipher.decrypt(value, field) if cipher is not None else value
+
+def conceal(value, field):
+    return cipher.encrypt(value, field) if cipher is not None and value is not None else value
+
+def get_setting(cursor, key):
+    cursor.execute("SELECT value FROM Settings WHERE key = ?", (key,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+#asks for the passphrase when the database is encrypted, False if it couldn't be unlocked
+def unlock_database(cursor, attempts=3):
+    global cipher
+    salt = get_setting(cursor, "encryption_salt")
+    if salt is None:
+        return True
+
+    params = json.loads(get_setting(cursor, "encryption_kdf"))
+    for _ in range(attempts):
+        candidate = Cipher(derive_key(getpass.getpass("Passphrase: "), bytes.fromhex(salt), **params))
+        if hmac.compare_digest(candidate.check_value(), get_setting(cursor, "encryption_check")):
+            cipher = candidate
+            return True
+        print("Wrong passphrase.")
+    return False
+
+#encrypt or decrypt every memory of one schema, fields already converted are skipped so an interrupted run can be resumed
+#each field is checked on its own by decrypting it, the prefix alone doesn't mean a value is encrypted
+def convert_memories(cursor, schema, active_cipher, encrypt):
+    cursor.execute(f"SELECT id, title, content FROM {schema}.Memory")
+    updates, tokens = [], []
+    for mem_id, *stored in cursor.fetchall():
+        decrypted = [active_cipher.try_decrypt(value, field) for field, value in zip(("title", "content"), stored)]
+        texts = [value if plaintext is None else plaintext for value, plaintext in zip(stored, decrypted)]
+        if encrypt:
+            pending = [value is not None and plaintext is None for value, plaintext in zip(stored, decrypted)]
+            if not any(pending):
+                continue
+            updates.append((*(active_cipher.encrypt(text, field) if todo else value
+                              for field, value, text, todo in zip(("title", "content"), stored, texts, pending)), mem_id))
+            tokens.extend((token, mem_id) for token in active_cipher.tokens(*texts))
+        else:
+            if all(plaintext is None for plaintext in decrypted):
+                continue
+            updates.append((*texts, mem_id))
+
+    cursor.executemany(f"UPDATE {schema}.Memory SET title = ?, content = ? WHERE id = ?", updates)
+    if encrypt:
+        cursor.executemany(f"INSERT OR IGNORE INTO {schema}.MemoryToken (token, memory_id) VALUES (?, ?)", tokens)
+    else:
+        cursor.execute(f"DELETE FROM {schema}.MemoryToken")
+    return len(updates)
+
+#archive volumes are cold and read-only, so each one is opened writable just for its conversion
+def convert_volumes(conn, active_cipher, encrypt):
+    cursor = conn.cursor()
+    attach_volumes(cursor, [])
+    converted = 0
+    for year in list_volumes():
+        cursor.execute("ATTACH DATABASE ? AS archive_vol", (f"file:{volume_path(year)}?mode=rw",))
+        try:
+            create_volume_tables(cursor, "archive_vol")
+            with conn:
+                converted += convert_memories(cursor, "archive_vol", active_cipher, encrypt)
+        finally:
+            cursor.execute("DETACH DATABASE archive_vol")
+    return converted
+
+#turn encryption on with a new passphrase, or finish an interrupted run
+def enable_encryption(conn, passphrase=None):
+    global cipher
+    cursor = conn.cursor()
+    conn.commit()
+
+    if cipher is None:
+        salt = os.urandom(16)
+        new_cipher = Cipher(derive_key(passphrase, salt, **KDF_PARAMS))
+        #key settings and the main database go in one transaction, a crash can't leave encrypted rows without their salt
+        with conn:
+            cursor.executemany("INSERT OR REPLACE INTO Settings (key, value) VALUES (?, ?)", [
+                ("encryption_salt", salt.hex()),
+                ("encryption_kdf", json.dumps(KDF_PARAMS)),
+                ("encryption_check", new_cipher.check_value()),
+            ])
+            converted = convert_memories(cursor, "main", new_cipher, encrypt=True)
+            cursor.execute("UPDATE MemoryIndex SET signature = NULL")     #unkeyed plaintext hashes, the next reindex writes keyed ones
+        cipher = new_cipher
+    else:
+        with conn:
+            converted = convert_memories(cursor, "main", cipher, encrypt=True)
+
+    converted += convert_volumes(conn, cipher, encrypt=True)
+    return converted
+
+#back to plaintext, volumes first so the key is only dropped once nothing needs it
+def disable_encryption(conn):
+    global cipher
+    cursor = conn.cursor()
+    conn.commit()
+    converted = convert_volumes(conn, cipher, encrypt=False)
+    with conn:
+        converted += convert_memories(cursor, "main", cipher, encrypt=False)
+        cursor.execute("DELETE FROM Settings WHERE key LIKE 'encryption_%'")
+    cipher = None
+    return converted
+
+#encrypt → set a passphrase and encrypt memories, decrypt → store them as plaintext again
+def encryption_command(conn, command):
+    if command == "encrypt":
+        passphrase = None
+        if cipher is None:
+            print("Memory titles and content will be encrypted. Without the passphrase they can't be recovered.")
+            passphrase = getpass.getpass("New passphrase: ")
+            if not passphrase or passphrase != getpass.getpass("Repeat passphrase: "):
+                print("Passphrases are empty or don't match, nothing changed.")
+                return
+        converted = enable_encryption(conn, passphrase)
+        print(f"Encrypted {converted} memories. Search now matches whole words in titles and content.")
+
+    elif cipher is None:
+        print("The database isn't encrypted.")
+
+    elif input("Store all memories as plaintext again? (Y/n): ").strip().lower() == "y":
+        converted = disable_encryption(conn)
+        print(f"Decrypted {converted} memories.")
+
+#keeps the word index of a memory in step with its text, nothing to do in plaintext mode
+def save_memory_tokens(cursor, mem_id, title, content):
+    if cipher is None:
+        return
+    cursor.execute("DELETE FROM MemoryToken WHERE memory_id = ?", (mem_id,))
+    cursor.executemany("INSERT INTO MemoryToken (token, memory_id) VALUES (?, ?)", [(token, mem_id) for token in cipher.tokens(title, content)])
+
+#where clause (and params) matching a search keyword against memory title/content
+def memory_text_match(query):
+    if cipher is None:
+        return "Memory.title LIKE ? OR Memory.content LIKE ?", [f"%{query}%", f"%{query}%"]
+    tokens = sorted(cipher.tokens(query))
+    if not tokens:
+        return "0", []
+    placeholders = ", ".join("?" * len(tokens))
+    return (f"Memory.id IN (SELECT memory_id FROM AllMemoryToken WHERE token IN ({placeholders}) "
+            f"GROUP BY memory_id HAVING COUNT(*) = {len(tokens)})"), tokens
+
+#----------------------------------------------------# RECORDS ## -------------------------------------------------------------------------------------------------------------------
+
+#slotted row types, the slots are the columns in display order so a record can be indexed like the tuple it replaces
+#queries only select the columns they need, slots that weren't selected stay None
+class Record:
+    __slots__ = ()
+
+    def __init__(self, *values):
+        if len(values) > len(self.__slots__):
+            raise TypeError(f"{type(self).__name__} takes at most {len(self.__slots__)} values, got {len(values)}")
+        for field, value in itertools.zip_longest(self.__slots__, values):
+            setattr(self, field, value)
+
+    #usable as a cursor row_factory
+    @classmethod
+    def from_row(cls, cursor, row):
+        return cls(*row)
+
+    def __getitem__(self, index):
+        return getattr(self, self.__slots__[index])
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __iter__(self):
+        return (getattr(self, field) for field in self.__slots__)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{field}={getattr(self, field)!r}' for field in self.__slots__)})"
+
+#memory_count/memory_ids are filled in by the search, not read from the table
+class Person(Record):
+    __slots__ = ("id", "name", "birthdate", "bio", "memory_count", "memory_ids")
+
+class Tag(Record):
+    __slots__ = ("id", "name", "description", "memory_count", "memory_ids")
+
+class Memory(Record):
+    __slots__ = ("id", "title", "content", "timestamp", "created_at")
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        memory = cls(*row)
+        memory.title = reveal(memory.title, "title")
+        memory.content = reveal(memory.content, "content")
+        return memory
+
+#one ranked memory in the search results
+class SearchHit(Record):
+    __slots__ = ("id", "title", "timestamp", "people", "tags", "score")
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        hit = cls(*row)
+        hit.title = reveal(hit.title, "title")
+        return hit
+
+#record type for each table that has one, other tables come back as plain tuples
+RECORD_TYPES = {"person": Person, "tag": Tag, "memory": Memory}
+
+#cursor on the same connection (same attached volumes) whose rows come back as records
+def record_cursor(cursor, record_type):
+    records = cursor.connection.cursor()
+    records.row_factory = record_type.from_row
+    return records
+
 #----------------------------------------------------# STANDARDISED TABLE DISPLAY ## -------------------------------------------------------------------------------------------------------------------
 
 #standardise character width for all characters
@@ -95,6 +653,7 @@ def pad_string(text, width):
     return text + " " * padding
 
 #display table
+@timed("render")
 def render_table(columns, rows, dynamic_columns=None):
 
     if not rows:
@@ -104,13 +663,19 @@ def render_table(columns, rows, dynamic_columns=None):
     if dynamic_columns is None:     #if instead dynamic_columns is set in parameters, it will persist throughout other calls of the function when modified.
         dynamic_columns = {"bio", "description"}
 
-    # Build column index map from original to new order
-    original_columns = columns.copy()
+    # Build column index map from original to new order, rows are read through it instead of being copied
+    original_columns = columns
     columns = [col for col in original_columns if col not in dynamic_columns] + [col for col in original_columns if col in dynamic_columns]
     column_indices = [original_columns.index(col) for col in columns]
 
-    # Reorder rows
-    rows = [[row[i] for i in column_indices] for row in rows]
+    #one C-level call per row, records are read by slot name
+    if isinstance(rows[0], Record):
+        read_row = operator.attrgetter(*(rows[0].__slots__[i] for i in column_indices))
+    else:
+        read_row = operator.itemgetter(*column_indices)
+    if len(column_indices) == 1:
+        read_single = read_row
+        read_row = lambda row: (read_single(row),)
 
 
     # Calculate column widths
@@ -147,7 +712,7 @@ def render_table(columns, rows, dynamic_columns=None):
     # Print rows
     for row in rows:
         line = []
-        for i, item in enumerate(row):
+        for i, item in enumerate(read_row(row)):
             col = columns[i]
             value = str(item) if item is not None else "—"  #converts item into string text so it can be joined
             width = col_widths[i]
@@ -172,13 +737,27 @@ def render_table(columns, rows, dynamic_columns=None):
         print(" | ".join(line))
 
 #view table
+@timed("view")
 def view_table(table_name, cursor, dynamic_columns=None):
     cursor.execute(f"PRAGMA table_info({table_name})")                  #grabs all metadata from table
     columns = [info[1] for info in cursor.fetchall()]                   #displays only the column names from metadata
 
     try:
-        cursor.execute(f"SELECT * FROM {table_name}")                       #grabs table content
-        rows = cursor.fetchall()
+        record_type = RECORD_TYPES.get(table_name.lower())
+        #columns added from the sql terminal don't fit the record, those tables are shown as plain rows
+        if record_type and tuple(columns) == record_type.__slots__[:len(columns)]:
+            rows_cursor = record_cursor(cursor, record_type)
+        else:
+            rows_cursor = cursor
+        if table_name.lower() == "memory":
+            rows = []
+            for _ in iter_volume_groups(cursor):                        #archived memories are shown along with the live ones
+                rows_cursor.execute("SELECT * FROM AllMemory")
+                rows.extend(rows_cursor.fetchall())
+            rows.sort(key=operator.itemgetter(0))
+        else:
+            rows_cursor.execute(f"SELECT * FROM {table_name}")              #grabs table content
+            rows = rows_cursor.fetchall()
 
         print(f"\nViewing table: {table_name}")
         render_table(columns, rows, dynamic_columns)
@@ -215,6 +794,7 @@ def validate_name(name, max_width = 12):
 
 # predict names of ppl and tags that already exist----------------
 #get existing names
+@timed("autocomplete")
 def get_existing_names(table_name, cursor):
     cursor.execute(f"SELECT name FROM {table_name}")
     names = [row[0] for row in cursor.fetchall()]
@@ -253,12 +833,13 @@ def get_autocomplete_list(label, table, cursor, conn, is_memory):
                 else:
                     ask = input(f"⚠️ New name: {name}, create new element in {table}?(Y/n)")
                     if ask.lower().strip() == "y" :
-                         create_profile(name, table, cursor, conn)
+                        entries.append(name)
+                        add_profile(name, table, cursor, conn, is_memory)
 
         elif entry in options:
             entries.append(entry)
             if not is_memory :
-                create_profile(entry, table, cursor, conn)
+                add_profile(entry, table, cursor, conn, is_memory)
 
         elif not validate_name(entry) :
             continue
@@ -267,50 +848,65 @@ def get_autocomplete_list(label, table, cursor, conn, is_memory):
             confirm = input(f"'{entry}' is new. Add it? (Y/n): ").strip().lower()
             if confirm == "y":
                 entries.append(entry)
-                create_profile(entry, table, cursor, conn)
+                add_profile(entry, table, cursor, conn, is_memory)
             
     return entries
 
+#while a memory is being saved, new profiles go into a savepoint of the memory's transaction instead of committing on their own
+def add_profile(entry, table, cursor, conn, is_memory):
+    if not is_memory:
+        create_profile(entry, table, cursor, conn)
+        return
+
+    cursor.execute("SAVEPOINT new_profile")
+    try:
+        create_profile(entry, table, cursor, conn, commit=False)
+    except BaseException:
+        cursor.execute("ROLLBACK TO new_profile")
+        cursor.execute("RELEASE new_profile")
+        raise
+    cursor.execute("RELEASE new_profile")
+
 #create new entries for person and tag
-def create_profile(entry, table, cursor, conn):
+def create_profile(entry, table, cursor, conn, commit=True):
     if table.lower() == "person":
-        manage_person_profile(entry, conn, cursor)
+        manage_person_profile(entry, conn, cursor, commit)
     elif table.lower() == "tag":
-        manage_tags(entry, conn, cursor)
+        manage_tags(entry, conn, cursor, commit)
     else:
         print(f"Err - Unknown table: {table}")
         return
 
 ## MANAGE PERSON PROFILE ## 
 #functioning manage person profile function
-def manage_person_profile(name, conn, cursor):
+def manage_person_profile(name, conn, cursor, commit=True):
     
     #find person from name
-    cursor.execute("SELECT id, birthdate, bio FROM Person WHERE name = ?", (name,))
-    result = cursor.fetchone()
+    people = record_cursor(cursor, Person)
+    people.execute("SELECT id, name, birthdate, bio FROM Person WHERE name = ?", (name,))
+    person = people.fetchone()
 
     #if exists
-    if result:
+    if person:
         #return and display details
-        person_id, old_birthdate, old_bio = result
         print(f"\nExisting profile for {name}:")
-        print(f"  Birthdate: {old_birthdate or '—'}")
-        print(f"  Bio: {old_bio or '—'}")
+        print(f"  Birthdate: {person.birthdate or '—'}")
+        print(f"  Bio: {person.bio or '—'}")
         print("Leave blank if you don't want to change anything.")
 
         #birthdate input with input validation
         while True:
             birthdate = input("Birthday (YYYY-MM-DD): ").strip()
             if not birthdate or validate_timestamp(birthdate):
-                birthdate = old_birthdate
+                birthdate = birthdate or person.birthdate
                 break
             print("Invalid format.")
 
         #bio input
-        bio = input("New bio: ").strip() or old_bio
+        bio = input("New bio: ").strip() or person.bio
 
         #apply changes
-        cursor.execute("UPDATE Person SET birthdate = ?, bio = ? WHERE id = ?",(birthdate, bio, person_id))
+        cursor.execute("UPDATE Person SET birthdate = ?, bio = ? WHERE id = ?",(birthdate, bio, person.id))
         print("Profile updated.")
 
     # if not existing profile
@@ -327,21 +923,22 @@ def manage_person_profile(name, conn, cursor):
                        (name, birthdate, bio))
         print("New profile created.")
 
-    conn.commit()
+    if commit:
+        conn.commit()
 
 ## TAG ENTERING SHEET ##
-def manage_tags(entry, conn, cursor):
-    cursor.execute("SELECT id, description FROM Tag WHERE name = ?", (entry,))
-    result = cursor.fetchone()
+def manage_tags(entry, conn, cursor, commit=True):
+    tags = record_cursor(cursor, Tag)
+    tags.execute("SELECT id, name, description FROM Tag WHERE name = ?", (entry,))
+    tag = tags.fetchone()
 
     #if existing Tag, print existing, prompt change
-    if result:
-        tag_id, description = result
+    if tag:
         print(f"\nExisting tag: {entry}")
-        print(f"Description: {description or '—'}")
+        print(f"Description: {tag.description or '—'}")
 
-        new_description = input("New description: ").strip() or description
-        cursor.execute("UPDATE Tag SET description = ? WHERE id = ?", (new_description, tag_id))
+        new_description = input("New description: ").strip() or tag.description
+        cursor.execute("UPDATE Tag SET description = ? WHERE id = ?", (new_description, tag.id))
 
         print ("Tag updated.")
 
@@ -351,12 +948,25 @@ def manage_tags(entry, conn, cursor):
         cursor.execute("INSERT INTO Tag (name, description) VALUES (?, ?)", (entry, description))
         print("New tag created.")
 
-    conn.commit()
+    if commit:
+        conn.commit()
 
 
 
 #--------------------------------------------# NEW MEMORY ENTRY ## -----------------------------------------------------------------------------------------------------------------------------
 
+#explicit transaction, committed once at the end or rolled back on any error (incl. ctrl-c)
+@contextlib.contextmanager
+def transaction(conn):
+    conn.commit()           #don't fold a pending implicit transaction into this one
+    conn.execute("BEGIN")
+    try:
+        yield
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
 #multi-line input support
 def get_multiline_input(prompt ="Enter text:"):  #default prompt to fall back to
     print(prompt)
@@ -391,109 +1001,121 @@ def new_or_edit_memory (cursor, conn, mem_id = None):
         """, (mem_id,))
         old_tags = [row[0] for row in cursor.fetchall()]
     #title, content and timestamp
-        cursor.execute("SELECT title, content, timestamp, created_at FROM Memory WHERE id = ?", (mem_id,))
-        result = cursor.fetchone()
+        memories = record_cursor(cursor, Memory)
+        memories.execute("SELECT id, title, content, timestamp, created_at FROM Memory WHERE id = ?", (mem_id,))
+        memory = memories.fetchone()
+
+        if memory is None:
+            year = find_memory_volume(cursor, mem_id)
+            if year:
+                print(f"Memory nr.{mem_id} is archived in {volume_path(year)} and is read-only.")
+            else:
+                print(f"No memory with id {mem_id}.")
+            return
 
-        old_title, old_content, old_timestamp, created_at = result
+        old_title, old_content, old_timestamp, created_at = memory.title, memory.content, memory.timestamp, memory.created_at
 
     else:
         old_title = old_content = old_timestamp = old_people = old_tags =""
 
 
-#if editing existing entry
-    if mem_id:
-        print(f"Editing memory nr.{mem_id}")
-        print("-" * 30)
+#one transaction from here on: new profiles, the memory row and its links are saved together or not at all
+    with transaction(conn):
+    #if editing existing entry
+        if mem_id:
+            print(f"Editing memory nr.{mem_id}")
+            print("-" * 30)
 
-        #display memory
-        display_memory(old_title, old_timestamp, old_content, old_people, old_tags, created_at)
+            #display memory
+            display_memory(old_title, old_timestamp, old_content, old_people, old_tags, created_at)
 
-        #title
-        while True:
-            title = input(f"Title [{old_title}]: ").strip() or old_title    #short circuit logic, if input is void, it returns false and promotes the second value
-            if validate_name(title, max_width = 30):
-                break
-            print("Invalid format.")
+            #title
+            while True:
+                title = input(f"Title [{old_title}]: ").strip() or old_title    #short circuit logic, if input is void, it returns false and promotes the second value
+                if validate_name(title, max_width = 30):
+                    break
+                print("Invalid format.")
         
-        #content
-        new_content = get_multiline_input("What happened?")
-        content = new_content if new_content.strip() else old_content
-
-        #timestamp
-        while True:
-            timestamp = input(f"Timestamp [{old_timestamp}] (YYYY-MM-DD): ").strip() or old_timestamp
-            if validate_timestamp(timestamp):
-                break
-            print("Invalid format.")
+            #content
+            new_content = get_multiline_input("What happened?")
+            content = new_content if new_content.strip() else old_content
+
+            #timestamp
+            while True:
+                timestamp = input(f"Timestamp [{old_timestamp}] (YYYY-MM-DD): ").strip() or old_timestamp
+                if validate_timestamp(timestamp):
+                    break
+                print("Invalid format.")
+
+        # People
+            print("\nCurrent people related to the event:", ", ".join(old_people) if old_people else "—")
+            if input("Edit people? (Y/n): ").strip().lower() == "y":
+                print("Please re-enter all relevant people.")
+                people = get_autocomplete_list("People", "Person", cursor, conn, is_memory)
+            else:
+                people = old_people
+        # Tags        
+            print("\nCurrent tags:", ", ".join(old_tags) if old_tags else "—")
+            if input("Edit tags? (Y/n): ").strip().lower() == "y":
+                print("Please re-enter all relevant tags.")
+                tags = get_autocomplete_list("Tags", "Tag", cursor, conn, is_memory)
+            else:
+                tags = old_tags
+        #commit
+            cursor.execute("UPDATE Memory SET title = ?, content = ?, timestamp = ? WHERE id = ?", (conceal(title, "title"), conceal(content, "content"), timestamp, mem_id))
+            cursor.execute("DELETE FROM MemoryIndex WHERE memory_id = ?", (mem_id,))    #stale now, the next reindex rebuilds it
 
-    # People
-        print("\nCurrent people related to the event:", ", ".join(old_people) if old_people else "—")
-        if input("Edit people? (Y/n): ").strip().lower() == "y":
-            print("Please re-enter all relevant people.")
-            people = get_autocomplete_list("People", "Person", cursor, conn, is_memory)
-        else:
-            people = old_people
-    # Tags        
-        print("\nCurrent tags:", ", ".join(old_tags) if old_tags else "—")
-        if input("Edit tags? (Y/n): ").strip().lower() == "y":
-            print("Please re-enter all relevant tags.")
-            tags = get_autocomplete_list("Tags", "Tag", cursor, conn, is_memory)
+    #if new entry
         else:
-            tags = old_tags
-    #delete old connections
-        cursor.execute("DELETE FROM MemoryPerson WHERE memory_id = ?", (mem_id,))
-        cursor.execute("DELETE FROM MemoryTag WHERE memory_id = ?", (mem_id,))
-    #commit
-        cursor.execute("UPDATE Memory SET title = ?, content = ?, timestamp = ? WHERE id = ?", (title, content, timestamp, mem_id))
-
-#if new entry
-    else:
-        #title
-        while True:
-            title = input(f"Title: ").strip()
-            if validate_name(title, max_width = 30):
-                break
-            print("Invalid format.")
+            #title
+            while True:
+                title = input(f"Title: ").strip()
+                if validate_name(title, max_width = 30):
+                    break
+                print("Invalid format.")
         
-        #content
-        content = get_multiline_input("What happened?")
-
-        #timestamp
-        while True:
-            timestamp = input(f"Timestamp (YYYY-MM-DD): ").strip()
-            if validate_timestamp(timestamp):
-                break
-            print("Invalid format.")
+            #content
+            content = get_multiline_input("What happened?")
+
+            #timestamp
+            while True:
+                timestamp = input(f"Timestamp (YYYY-MM-DD): ").strip()
+                if validate_timestamp(timestamp):
+                    break
+                print("Invalid format.")
         
-        #people and tags
-        people = get_autocomplete_list("People", "Person", cursor, conn, is_memory)
-        tags = get_autocomplete_list("Tags", "Tag", cursor, conn, is_memory)
-
-        #update db
-        cursor.execute("INSERT INTO Memory (title, content, timestamp) VALUES (?, ?, ?)", (title, content, timestamp))
-        mem_id = cursor.lastrowid
-
-    # Link people
-    for name in people:
-        cursor.execute("SELECT id FROM Person WHERE name = ?", (name,))
-        result = cursor.fetchone()
-        
-        if result:
-            person_id = result[0]
-            cursor.execute("INSERT OR IGNORE INTO MemoryPerson (memory_id, person_id) VALUES (?, ?)", (mem_id, person_id))
-    
+            #people and tags
+            people = get_autocomplete_list("People", "Person", cursor, conn, is_memory)
+            tags = get_autocomplete_list("Tags", "Tag", cursor, conn, is_memory)
 
+            #update db
+            cursor.execute("INSERT INTO Memory (title, content, timestamp) VALUES (?, ?, ?)", (conceal(title, "title"), conceal(content, "content"), timestamp))
+            mem_id = cursor.lastrowid
 
-    # Link tags
-    for tag in tags:
-        cursor.execute("SELECT id FROM Tag WHERE name = ?", (tag,))
-        result = cursor.fetchone()
-        
-        if result:
-            tag_id = result[0]
-            cursor.execute("INSERT OR IGNORE INTO MemoryTag (memory_id, tag_id) VALUES (?, ?)", (mem_id, tag_id))
+        # Link people and tags, only the links that changed are written
+        save_memory_links(cursor, mem_id, people, tags)
+        save_memory_tokens(cursor, mem_id, title, content)
 
-    conn.commit()
+
+#memory links for a list of names, resolved in one query per table and diffed against the links already stored
+def save_memory_links(cursor, mem_id, people, tags):
+    sync_links(cursor, "MemoryPerson", "person_id", mem_id, resolve_ids(cursor, "Person", people))
+    sync_links(cursor, "MemoryTag", "tag_id", mem_id, resolve_ids(cursor, "Tag", tags))
+
+#ids of the given names, for duplicate person names the oldest profile wins (same as a plain SELECT ... fetchone)
+def resolve_ids(cursor, table, names):
+    names = list(dict.fromkeys(names))
+    if not names:
+        return set()
+    placeholders = ", ".join("?" * len(names))
+    cursor.execute(f"SELECT name, id FROM {table} WHERE name IN ({placeholders}) ORDER BY id DESC", names)
+    return set(dict(cursor.fetchall()).values())
+
+def sync_links(cursor, link_table, column, mem_id, new_ids):
+    cursor.execute(f"SELECT {column} FROM {link_table} WHERE memory_id = ?", (mem_id,))
+    old_ids = {row[0] for row in cursor.fetchall()}
+    cursor.executemany(f"DELETE FROM {link_table} WHERE memory_id = ? AND {column} = ?", [(mem_id, i) for i in sorted(old_ids - new_ids)])
+    cursor.executemany(f"INSERT INTO {link_table} (memory_id, {column}) VALUES (?, ?)", [(mem_id, i) for i in sorted(new_ids - old_ids)])
 
 def display_memory(title, timestamp, content, people,tags,created_at):
 
@@ -521,13 +1143,21 @@ def main_search_function(cursor, conn) :
         print("Invalid input. Using default of 10.")
         row_limit = 10
 
+    date_range = parse_year_range(input("Limit memories to years (e.g. 2019 or 2015-2020, blank for all): "))
+
     search_person(cursor, queries, max_rows=10)
     search_tag(cursor, queries, max_rows=10)
-    search_memories(cursor, queries, row_limit)
+    search_memories(cursor, queries, row_limit, date_range)
+
+    prompt_modify_entries(cursor, conn)
 
+#offer to edit one of the entries that were just listed
+def prompt_modify_entries(cursor, conn):
     ask = input("Would you like to modify any entries?(Y/n)")
     if ask.lower().strip() == "y" :
         table, query_id = prompt_edit_target()
+        if table is None:
+            return
         if table.lower().strip() == "memory" :
             new_or_edit_memory (cursor, conn, query_id)
         elif table.lower().strip() == "tag":
@@ -541,31 +1171,141 @@ def main_search_function(cursor, conn) :
             if result :
                 manage_person_profile(result[0], conn, cursor)
 
-#individual tables search
-def search_person(cursor, queries=None, max_rows=10):
+PERSON_COLUMNS = ["ID", "Name", "Birthdate", "Bio", "Memory Count", "Memory IDs"]
+TAG_COLUMNS = ["ID", "Name", "Description", "Memory Count", "Memory IDs"]
+MEMORY_COLUMNS = ["ID", "Title", "Timestamp", "People", "Tags"]     #SearchHit slot order, displayed as ID, Timestamp, Title, People, Tags
+
+#ranking, shared by the printed search and the live search
+#Person records matching any query, exact name matches first
+def rank_people(cursor, queries):
     score_map = defaultdict(int)
     row_map = {}
-
-    #for reusability
-    if queries is None:
-        querypack = input("Search for person (comma-separated): ")
-        queries = [q.strip() for q in querypack.split(",") if q.strip()]
+    people = record_cursor(cursor, Person)
 
     for query in queries:
-        cursor.execute("""
+        people.execute("""
             SELECT id, name, birthdate, bio
             FROM Person
             WHERE name LIKE ? OR birthdate LIKE ? OR id = ? OR bio LIKE ?
         """, (f"%{query}%", f"%{query}%", query if query.isdigit() else -1, f"%{query}%"))
 
-        for row in cursor.fetchall():
-            pid = row[0]
-            row_map[pid] = row
-            score_map[pid] += 1
-            if row[1].strip().lower() == query.lower():
-                score_map[pid] += 100
+        for person in people.fetchall():
+            row_map[person.id] = person
+            score_map[person.id] += 1
+            if person.name.strip().lower() == query.lower():
+                score_map[person.id] += 100
+
+    return sorted(row_map.values(), key=lambda person: score_map[person.id], reverse=True)
+
+def rank_tags(cursor, queries):
+    score_map = defaultdict(int)
+    row_map = {}
+    tags = record_cursor(cursor, Tag)
+
+    for query in queries:
+        tags.execute("""
+            SELECT id, name, description
+            FROM Tag
+            WHERE name LIKE ? OR id = ? OR description LIKE ?
+        """, (f"%{query}%", query if query.isdigit() else -1, f"%{query}%"))
 
-    ranked = sorted(row_map.items(), key=lambda x: score_map[x[0]], reverse=True)
+        for tag in tags.fetchall():
+            row_map[tag.id] = tag
+            score_map[tag.id] += 1
+            if tag.name.strip().lower() == query.lower():
+                score_map[tag.id] += 100
+
+    return sorted(row_map.values(), key=lambda tag: score_map[tag.id], reverse=True)
+
+#memory ids linked to each person/tag id, archive volumes included
+def linked_memory_ids(cursor, link_view, column, ids):
+    memory_ids = defaultdict(list)
+    for _ in iter_volume_groups(cursor):
+        for item_id in ids:
+            cursor.execute(f"SELECT memory_id FROM {link_view} WHERE {column} = ?", (item_id,))
+            memory_ids[item_id].extend(str(r[0]) for r in cursor.fetchall())
+    return memory_ids
+
+#fill in memory count and ids on ranked Person/Tag records, in place
+def linked_rows(cursor, ranked, link_view, column):
+    memory_ids = linked_memory_ids(cursor, link_view, column, [record.id for record in ranked])
+    for record in ranked:
+        record.memory_count = len(memory_ids[record.id])
+        record.memory_ids = ", ".join(memory_ids[record.id]) or "—"
+    return ranked
+
+#(match count, top max_rows SearchHits)
+def rank_memories(cursor, queries, max_rows=10, date_range=None):
+
+    ranked = []
+    match_count = 0
+    #exact_hits = set()
+
+    #only filter when asked, timestamps can be NULL or free text and those memories must still be found
+    year_filter, year_params = ("AND substr(Memory.timestamp, 1, 4) BETWEEN ? AND ?", date_range) if date_range else ("", ())
+    hits = record_cursor(cursor, SearchHit)
+
+    #every memory lives in exactly one volume, so scores are final within a group of volumes
+    for _ in iter_volume_groups(cursor, date_range):
+        score_map = defaultdict(int)    #only ids while scanning, titles are read for the top hits only
+
+        for query in queries : 
+            text_match, text_params = memory_text_match(query)     #LIKE in plaintext mode, the word index when encrypted
+            cursor.execute(f"""
+                SELECT DISTINCT Memory.id FROM AllMemory AS Memory
+                LEFT JOIN AllMemoryPerson AS MemoryPerson ON Memory.id = MemoryPerson.memory_id
+                LEFT JOIN Person ON MemoryPerson.person_id = Person.id
+                LEFT JOIN AllMemoryTag AS MemoryTag ON Memory.id = MemoryTag.memory_id
+                LEFT JOIN Tag ON MemoryTag.tag_id = Tag.id
+                WHERE ({text_match}
+                    OR Person.name LIKE ? OR Tag.name LIKE ?)
+                    {year_filter}
+                ORDER BY Memory.timestamp DESC
+            """, (*text_params, f"%{query}%", f"%{query}%", *year_params))
+
+            for (mid,) in cursor:   # iterates through fetched rows
+                score_map[mid] += 1
+
+        group_ranked = sorted(score_map, key=score_map.__getitem__, reverse=True)[:max_rows]
+        match_count += len(score_map)
+
+        #titles and links have to be read while this group is still attached
+        for mem_id in group_ranked:
+            hits.execute("SELECT id, title, timestamp FROM AllMemory WHERE id = ?", (mem_id,))
+            hit = hits.fetchone()
+            hit.score = score_map[mem_id]
+
+            # Get linked people
+            cursor.execute("""
+                SELECT name FROM Person
+                JOIN AllMemoryPerson AS MemoryPerson ON Person.id = MemoryPerson.person_id
+                WHERE MemoryPerson.memory_id = ?
+            """, (mem_id,))
+            hit.people = ", ".join(r[0] for r in cursor.fetchall())
+
+            # Get linked tags
+            cursor.execute("""
+                SELECT name FROM Tag
+                JOIN AllMemoryTag AS MemoryTag ON Tag.id = MemoryTag.tag_id
+                WHERE MemoryTag.memory_id = ?
+            """, (mem_id,))
+            hit.tags = ", ".join(r[0] for r in cursor.fetchall())
+
+            ranked.append(hit)
+
+    ranked.sort(key=lambda hit: hit.score, reverse=True)
+    return match_count, ranked[:max_rows]
+
+#individual tables search
+@timed("search.person")
+def search_person(cursor, queries=None, max_rows=10):
+
+    #for reusability
+    if queries is None:
+        querypack = input("Search for person (comma-separated): ")
+        queries = [q.strip() for q in querypack.split(",") if q.strip()]
+
+    ranked = rank_people(cursor, queries)
     match_count = len(ranked)
     print(f"\nFound {match_count} matching people.")
     if not ranked:
@@ -576,39 +1316,17 @@ def search_person(cursor, queries=None, max_rows=10):
         print(f"Showing top {max_rows} matches:")
         ranked = ranked[:max_rows]
 
-    headers = ["ID", "Name", "Birthdate", "Bio", "Memory Count", "Memory IDs"]
-    rows = []
-
-    for pid, row in ranked:
-        cursor.execute("SELECT memory_id FROM MemoryPerson WHERE person_id = ?", (pid,))
-        memory_ids = [str(r[0]) for r in cursor.fetchall()]
-        rows.append(list(row) + [len(memory_ids), ", ".join(memory_ids) or "—"])
-
-    render_table(headers, rows, dynamic_columns={"Bio", "Memory IDs"})
+    rows = linked_rows(cursor, ranked, "AllMemoryPerson", "person_id")
+    render_table(PERSON_COLUMNS, rows, dynamic_columns={"Bio", "Memory IDs"})
 
+@timed("search.tag")
 def search_tag(cursor, queries=None, max_rows=10):
-    score_map = defaultdict(int)
-    row_map = {}
 
     if queries is None:
         querypack = input("Search for tag (comma-separated): ")
         queries = [q.strip() for q in querypack.split(",") if q.strip()]
 
-    for query in queries:
-        cursor.execute("""
-            SELECT id, name, description
-            FROM Tag
-            WHERE name LIKE ? OR id = ? OR description LIKE ?
-        """, (f"%{query}%", query if query.isdigit() else -1, f"%{query}%"))
-
-        for row in cursor.fetchall():
-            tid = row[0]
-            row_map[tid] = row
-            score_map[tid] += 1
-            if row[1].strip().lower() == query.lower():
-                score_map[tid] += 100
-
-    ranked = sorted(row_map.items(), key=lambda x: score_map[x[0]], reverse=True)
+    ranked = rank_tags(cursor, queries)
     match_count = len(ranked)
     print(f"\nFound {match_count} matching tags.")
     if not ranked:
@@ -619,94 +1337,31 @@ def search_tag(cursor, queries=None, max_rows=10):
         print(f"Showing top {max_rows} matches:")
         ranked = ranked[:max_rows]
 
-    headers = ["ID", "Name", "Description", "Memory Count", "Memory IDs"]
-    rows = []
-
-    for tid, row in ranked:
-        cursor.execute("SELECT memory_id FROM MemoryTag WHERE tag_id = ?", (tid,))
-        memory_ids = [str(r[0]) for r in cursor.fetchall()]
-        rows.append(list(row) + [len(memory_ids), ", ".join(memory_ids) or "—"])
-
-    render_table(headers, rows, dynamic_columns={"Description", "Memory IDs"})
-
-def search_memories(cursor, queries = None, max_rows = 10):
+    rows = linked_rows(cursor, ranked, "AllMemoryTag", "tag_id")
+    render_table(TAG_COLUMNS, rows, dynamic_columns={"Description", "Memory IDs"})
 
-    score_map = defaultdict(int)
-    row_map = {}
-    #exact_hits = set()
+@timed("search.memories")
+def search_memories(cursor, queries = None, max_rows = 10, date_range = None):
 
     if queries == None :
         querypack = input("Search memories by keyword (like alice, bob, canteen): ").strip()
         queries = [query.strip() for query in querypack.split(",") if query.strip()]
 
-    for query in queries : 
-        cursor.execute("""
-            SELECT DISTINCT Memory.id, Memory.title, Memory.timestamp FROM Memory
-            LEFT JOIN MemoryPerson ON Memory.id = MemoryPerson.memory_id
-            LEFT JOIN Person ON MemoryPerson.person_id = Person.id
-            LEFT JOIN MemoryTag ON Memory.id = MemoryTag.memory_id
-            LEFT JOIN Tag ON MemoryTag.tag_id = Tag.id
-            WHERE Memory.title LIKE ? OR Memory.content LIKE ?
-                OR Person.name LIKE ? OR Tag.name LIKE ?
-            ORDER BY Memory.timestamp DESC
-        """, (f"%{query}%", f"%{query}%", f"%{query}%", f"%{query}%"))
-
-        
-        for row in cursor.fetchall():   # iterates through fetched rows
-            mid = row[0]
-            row_map[mid] = row
-            score_map[mid] += 1
-
-    ranked = sorted(row_map.items(), key=lambda x: score_map[x[0]], reverse=True)
-    match_count = len(ranked)
+    match_count, rows = rank_memories(cursor, queries, max_rows, date_range)
     print(f"\nFound {match_count} matching memories.")
 
     if match_count > max_rows:
         print(f"Showing top {max_rows} matches:")
-        ranked = ranked[:max_rows]
 
-    if not ranked:
+    if not rows:
         print("No matching memories found.")
         return None
 
-    rows = []
-    memory_metadata = {}
-
-    for mem_id, row in ranked:
-        title = row[1]
-        timestamp = row[2]
-
-        # Get linked people
-        cursor.execute("""
-            SELECT name FROM Person
-            JOIN MemoryPerson ON Person.id = MemoryPerson.person_id
-            WHERE MemoryPerson.memory_id = ?
-        """, (mem_id,))
-        people = [r[0] for r in cursor.fetchall()]
-
-        # Get linked tags
-        cursor.execute("""
-            SELECT name FROM Tag
-            JOIN MemoryTag ON Tag.id = MemoryTag.tag_id
-            WHERE MemoryTag.memory_id = ?
-        """, (mem_id,))
-        tags = [r[0] for r in cursor.fetchall()]
-
-        people_str = ", ".join(people)
-        tags_str = ", ".join(tags)
-
-        rows.append([mem_id, title, people_str, tags_str, timestamp])
-        memory_metadata[mem_id] = {
-            "people": people_str,
-            "tags": tags_str
-        }
-
     # Render the table
-    columns = ["ID", "Title", "People", "Tags", "Timestamp"]
-    render_table(columns, rows, dynamic_columns={"Title", "People", "Tags"})
+    render_table(MEMORY_COLUMNS, rows, dynamic_columns={"Title", "People", "Tags"})
 
     #returns found mem ids
-    return {row[0] for row in rows}
+    return {hit.id for hit in rows}
 
 #edit after search
 def prompt_edit_target():
@@ -733,6 +1388,139 @@ def prompt_edit_target():
             print("Format must be: [table] [id]")
 
 
+#----------------------------------# LIVE SEARCH #--------------------------------------------------------------------------
+
+LIVE_SEARCH_DEBOUNCE = 0.15     #seconds of no typing before a search starts
+LIVE_SEARCH_ROWS = 5            #rows per table in the live view
+
+#state shared between the ui (event loop) and the search worker thread
+class LiveSearch:
+    def __init__(self, search_conn):
+        self.conn = search_conn
+        self.cursor = search_conn.cursor()
+        self.executor = ThreadPoolExecutor(max_workers=1)   #one connection, one query at a time
+        self.generation = 0     #bumped on every keystroke, results from older generations are dropped
+        self.running = False
+        self.task = None
+        self.sections = {}
+        self.status = "Type to search people, tags and memories."
+
+    #runs on the worker thread
+    def run_stage(self, stage, queries, generation):
+        if generation != self.generation:
+            return None
+        self.running = True
+        try:
+            return stage(self.cursor, queries)
+        except sqlite3.OperationalError as e:
+            if "interrupt" in str(e):
+                return None
+            raise
+        finally:
+            self.running = False
+
+    #cancel whatever is pending or running, a newer query is on its way
+    def cancel(self):
+        self.generation += 1
+        if self.task is not None:
+            self.task.cancel()
+        if self.running:
+            self.conn.interrupt()
+
+    #people and tags are cheap and go first, memories follow, each table shows up as soon as it's ready
+    async def refresh(self, app, text, generation):
+        await asyncio.sleep(LIVE_SEARCH_DEBOUNCE)
+        queries = [q.strip() for q in text.split(",") if q.strip()]
+        self.sections = {}
+        if not queries:
+            self.status = "Type to search people, tags and memories."
+            app.invalidate()
+            return
+
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        for title, stage in LIVE_SEARCH_STAGES:
+            self.status = f"Searching {title.lower()}..."
+            app.invalidate()
+            result = await loop.run_in_executor(self.executor, self.run_stage, stage, queries, generation)
+            if generation != self.generation or result is None:
+                return
+            self.sections[title] = result
+        self.status = f"Done in {(time.perf_counter() - start) * 1000:.0f} ms. Enter to finish, Esc to leave."
+        app.invalidate()
+
+    def on_text_changed(self, app, text):
+        self.cancel()
+        self.task = app.create_background_task(self.refresh(app, text, self.generation))
+
+    #render_table prints, so its output is captured for the results pane
+    def results_text(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            print(self.status)
+            for title, (match_count, columns, rows, dynamic_columns) in self.sections.items():
+                print(f"\n{title}: {match_count} found")
+                if rows:
+                    render_table(columns, rows, dynamic_columns=dynamic_columns)
+        return output.getvalue()
+
+#each stage returns (match count, columns, top rows, dynamic columns)
+def live_people_stage(cursor, queries):
+    ranked = rank_people(cursor, queries)
+    rows = linked_rows(cursor, ranked[:LIVE_SEARCH_ROWS], "AllMemoryPerson", "person_id")
+    return len(ranked), PERSON_COLUMNS, rows, {"Bio", "Memory IDs"}
+
+def live_tags_stage(cursor, queries):
+    ranked = rank_tags(cursor, queries)
+    rows = linked_rows(cursor, ranked[:LIVE_SEARCH_ROWS], "AllMemoryTag", "tag_id")
+    return len(ranked), TAG_COLUMNS, rows, {"Description", "Memory IDs"}
+
+def live_memories_stage(cursor, queries):
+    match_count, rows = rank_memories(cursor, queries, LIVE_SEARCH_ROWS)
+    return match_count, MEMORY_COLUMNS, rows, {"Title", "People", "Tags"}
+
+LIVE_SEARCH_STAGES = [("People", live_people_stage), ("Tags", live_tags_stage), ("Memories", live_memories_stage)]
+
+#search-as-you-type, queries run on a worker thread with their own connection so typing never waits on the database
+def live_search(cursor, conn):
+    conn.commit()
+    search = LiveSearch(connect_db(instrumented=recording(), check_same_thread=False))
+
+    bindings = KeyBindings()
+
+    @bindings.add("enter")
+    def _finish(event):
+        event.app.exit(result=True)
+
+    @bindings.add("escape")
+    @bindings.add("c-c")
+    def _leave(event):
+        event.app.exit(result=False)
+
+    search_buffer = Buffer(multiline=False)
+    layout = Layout(HSplit([
+        Window(FormattedTextControl("Live search, separate keywords with commas"), height=1),
+        Window(BufferControl(buffer=search_buffer), height=1),
+        Window(height=1, char="-"),
+        Window(FormattedTextControl(search.results_text), wrap_lines=False),
+    ]), focused_element=search_buffer)
+
+    app = Application(layout=layout, key_bindings=bindings, full_screen=True)
+    search_buffer.on_text_changed += lambda buffer: search.on_text_changed(app, buffer.text)
+
+    try:
+        finished = app.run()
+    finally:
+        search.cancel()
+        search.executor.shutdown(wait=True)
+        search.conn.close()
+
+    #leave the final results on screen for the usual edit prompt
+    if finished and search.sections:
+        print(search.results_text())
+        prompt_modify_entries(cursor, conn)
+
+
 #----------------------------------#SQL tool #--------------------------------------------------------------------------
 def sql_terminal(cursor, conn):
 
@@ -757,13 +1545,509 @@ def sql_terminal(cursor, conn):
             print(f"Error: {e}")
 
 
+#----------------------------------# BATCH PROCESSING #--------------------------------------------------------------------------
+
+BATCH_CHUNK_SIZE = 2000     #memories per worker job
+BATCH_WRITE_SIZE = 20000    #results collected before the writer commits them in one transaction
+
+#split Memory into id ranges, one per worker job
+def get_id_ranges(cursor, chunk_size=BATCH_CHUNK_SIZE):
+    cursor.execute("SELECT MIN(id), MAX(id) FROM Memory")
+    first_id, last_id = cursor.fetchone()
+    if first_id is None:
+        return []
+    return [(start, min(start + chunk_size - 1, last_id)) for start in range(first_id, last_id + 1, chunk_size)]
+
+#workers never write, so each one gets its own read-only connection
+def open_read_only(db_path=DB_PATH):
+    return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+_worker_conn = None     #one read-only connection per worker process, closed when the pool shuts the process down
+
+def _init_batch_worker(db_path):
+    global _worker_conn
+    _worker_conn = open_read_only(db_path)
+
+#runs inside a worker process, task must be a top level function so it can be pickled
+def _batch_worker(task, first_id, last_id):
+    return task(_worker_conn.cursor(), first_id, last_id)
+
+#write a batch of results in one transaction through the main (only) writer connection
+def _flush_results(conn, write_results, results):
+    if not results:
+        return 0
+    with conn:
+        write_results(conn.cursor(), results)
+    return len(results)
+
+#shared stage: fan id ranges out to a process pool, write results back from this process only
+def run_batch(conn, task, write_results, jobs=None, chunk_size=BATCH_CHUNK_SIZE, label="Processing"):
+    ranges = get_id_ranges(conn.cursor(), chunk_size)
+    if not ranges:
+        print("Nothing to process.")
+        return 0
+
+    conn.commit()   #workers only see committed data
+    pending = []
+    collected = written = 0
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_batch_worker, initargs=(DB_PATH,)) as pool:
+        futures = [pool.submit(_batch_worker, task, first_id, last_id) for first_id, last_id in ranges]
+        for done, future in enumerate(as_completed(futures), 1):
+            results = future.result()
+            pending.extend(results)
+            collected += len(results)
+            if len(pending) >= BATCH_WRITE_SIZE:
+                written += _flush_results(conn, write_results, pending)
+                pending = []
+            print(f"\r{label}: {done}/{len(ranges)} chunks, {collected} rows collected, {written} written", end="", flush=True)
+
+    written += _flush_results(conn, write_results, pending)
+    print(f"\r{label}: {len(ranges)}/{len(ranges)} chunks, {collected} rows collected, {written} written")
+    return written
+
+#derived data per memory, signature lets unchanged memories be skipped on the next run
+#when encrypted it's keyed, a plain hash of the plaintext would let anyone with the file confirm a guessed entry
+def memory_signature(title, content, timestamp, signer=None):
+    data = "\0".join((title or "", content or "", timestamp or "")).encode("utf-8")
+    return signer.signature(data) if signer is not None else hashlib.sha1(data).hexdigest()
+
+#key_material comes in from the parent process when memories are encrypted, lengths are always taken from the plaintext
+def index_memory_range(cursor, first_id, last_id, key_material=None):
+    worker_cipher = Cipher(key_material) if key_material else None
+    cursor.execute("""
+        SELECT Memory.id, Memory.title, Memory.content, Memory.timestamp, MemoryIndex.signature
+        FROM Memory
+        LEFT JOIN MemoryIndex ON Memory.id = MemoryIndex.memory_id
+        WHERE Memory.id BETWEEN ? AND ?
+    """, (first_id, last_id))
+
+    results = []
+    for mem_id, title, content, timestamp, old_signature in cursor.fetchall():
+        if worker_cipher is not None:
+            title, content = worker_cipher.decrypt_uncached(title, "title"), worker_cipher.decrypt_uncached(content, "content")
+        signature = memory_signature(title, content, timestamp, worker_cipher)
+        if signature == old_signature:
+            continue
+        results.append((mem_id, len(content or ""), signature))
+    return results
+
+def write_memory_index(cursor, results):
+    cursor.executemany("""
+        INSERT OR REPLACE INTO MemoryIndex (memory_id, content_length, signature)
+        VALUES (?, ?, ?)
+    """, results)
+
+#rebuild derived memory data (content lengths the snapshot reads instead of measuring every memory)
+def reindex_memories(conn, jobs=None):
+    task = functools.partial(index_memory_range, key_material=cipher.key_material) if cipher is not None else index_memory_range
+    written = run_batch(conn, task, write_memory_index, jobs=jobs, label="Reindexing")
+    with conn:
+        conn.execute("DELETE FROM MemoryIndex WHERE memory_id NOT IN (SELECT id FROM Memory)")
+    print(f"Reindex finished, {written} memories updated.")
+
+#reads '--jobs N' from a command, None means one worker per core
+def parse_jobs_option(command):
+    parts = command.split()
+    if "--jobs" not in parts:
+        return None
+    try:
+        return max(1, int(parts[parts.index("--jobs") + 1]))
+    except (IndexError, ValueError):
+        print("--jobs expects a number, using one worker per core.")
+        return None
+
+
+#----------------------------------# ARCHIVE VOLUMES #--------------------------------------------------------------------------
+
+ARCHIVE_PREFIX = "memory_archive_"  #one memory_archive_YYYY.sqlite per year, next to the main database
+MAX_ATTACHED_VOLUMES = 8            #sqlite allows 10 attached databases by default, keep some room
+
+def volume_path(year):
+    return os.path.join(os.path.dirname(DB_PATH), f"{ARCHIVE_PREFIX}{year}.sqlite")
+
+#years that have a volume on disk, newest first, optionally only those overlapping (first_year, last_year)
+def list_volumes(date_range=None):
+    years = []
+    for path in glob.glob(volume_path("[0-9]" * 4)):
+        year = os.path.basename(path)[len(ARCHIVE_PREFIX):-len(".sqlite")]
+        if date_range is None or date_range[0] <= year <= date_range[1]:
+            years.append(year)
+    return sorted(years, reverse=True)
+
+#cold volumes are opened read-only, archive_memories opens them read-write itself
+def attach_volumes(cursor, years):
+    cursor.execute("PRAGMA database_list")
+    attached = {row[1] for row in cursor.fetchall() if row[1].startswith("vol_")}
+    wanted = {f"vol_{year}" for year in years}
+
+    for schema in attached - wanted:
+        cursor.execute(f"DETACH DATABASE {schema}")
+    for year in years:
+        if f"vol_{year}" not in attached:
+            cursor.execute(f"ATTACH DATABASE ? AS vol_{year}", (f"file:{volume_path(year)}?mode=ro",))
+
+#temp views that read main and the attached volumes as if they were one set of tables
+def build_memory_views(cursor, years, include_main=True):
+    schemas = (["main"] if include_main else []) + [f"vol_{year}" for year in years]
+    for view, table in (("AllMemory", "Memory"), ("AllMemoryPerson", "MemoryPerson"), ("AllMemoryTag", "MemoryTag"), ("AllMemoryToken", "MemoryToken")):
+        sources = [f"SELECT * FROM {schema}.{table}" for schema in schemas if table_exists(cursor, schema, table)]
+        cursor.execute(f"DROP VIEW IF EXISTS temp.{view}")
+        cursor.execute(f"CREATE TEMP VIEW {view} AS " + (" UNION ALL ".join(sources) or f"SELECT * FROM main.{table} WHERE 0"))
+
+#volumes archived before the word index existed have no MemoryToken table
+def table_exists(cursor, schema, table):
+    cursor.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    return cursor.fetchone() is not None
+
+#attach the volumes a query needs in groups that fit the attach limit, yields once per group
+#volumes outside date_range are never opened
+def iter_volume_groups(cursor, date_range=None):
+    years = list_volumes(date_range)
+    groups = [years[i:i + MAX_ATTACHED_VOLUMES] for i in range(0, len(years), MAX_ATTACHED_VOLUMES)] or [[]]
+    for index, group in enumerate(groups):
+        attach_volumes(cursor, group)
+        build_memory_views(cursor, group, include_main=index == 0)
+        yield group
+
+#volume year an archived memory lives in, None if it isn't archived
+def find_memory_volume(cursor, mem_id):
+    for group in iter_volume_groups(cursor):
+        for year in group:
+            cursor.execute(f"SELECT 1 FROM vol_{year}.Memory WHERE id = ?", (mem_id,))
+            if cursor.fetchone():
+                return year
+    return None
+
+#'2019' or '2015-2020' to a (first_year, last_year) pair, blank means no limit
+def parse_year_range(text):
+    text = text.strip()
+    if not text:
+        return None
+    match = re.fullmatch(r"(\d{4})\s*(?:-\s*(\d{4}))?", text)
+    if not match:
+        print("Invalid year range, searching all years.")
+        return None
+    first_year, last_year = match.group(1), match.group(2) or match.group(1)
+    return (min(first_year, last_year), max(first_year, last_year))
+
+def create_volume_tables(cursor, schema):
+    cursor.executescript(f"""
+    CREATE TABLE IF NOT EXISTS {schema}.Memory (
+        id INTEGER PRIMARY KEY,
+        title TEXT,
+        content TEXT NOT NULL,
+        timestamp TEXT,
+        created_at TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS {schema}.MemoryPerson (
+        memory_id INTEGER NOT NULL,
+        person_id INTEGER NOT NULL,
+        PRIMARY KEY (memory_id, person_id)
+    );
+
+    CREATE TABLE IF NOT EXISTS {schema}.MemoryTag (
+        memory_id INTEGER NOT NULL,
+        tag_id INTEGER NOT NULL,
+        PRIMARY KEY (memory_id, tag_id)
+    );
+
+    CREATE INDEX IF NOT EXISTS {schema}.idx_memory_timestamp ON Memory(timestamp);
+    CREATE INDEX IF NOT EXISTS {schema}.idx_memoryperson_person ON MemoryPerson(person_id);
+    CREATE TABLE IF NOT EXISTS {schema}.MemoryToken (
+        token BLOB NOT NULL,
+        memory_id INTEGER NOT NULL,
+        PRIMARY KEY (token, memory_id)
+    ) WITHOUT ROWID;
+
+    CREATE INDEX IF NOT EXISTS {schema}.idx_memorytag_tag ON MemoryTag(tag_id);
+    CREATE INDEX IF NOT EXISTS {schema}.idx_memorytoken_memory ON MemoryToken(memory_id);
+    """)
+
+#move memories dated before before_year out of the main database into yearly volumes
+def archive_memories(conn, before_year):
+    cursor = conn.cursor()
+    conn.commit()
+    attach_volumes(cursor, [])      #volumes are re-attached read-write below
+
+    cursor.execute("""
+        SELECT DISTINCT substr(timestamp, 1, 4) FROM Memory
+        WHERE substr(timestamp, 1, 4) GLOB '[0-9][0-9][0-9][0-9]' AND substr(timestamp, 1, 4) < ?
+        ORDER BY 1
+    """, (before_year,))
+    years = [row[0] for row in cursor.fetchall()]
+    if not years:
+        print(f"No memories dated before {before_year}.")
+        return
+
+    moved = 0
+    for year in years:
+        cursor.execute("ATTACH DATABASE ? AS archive_vol", (f"file:{volume_path(year)}?mode=rwc",))
+        try:
+            create_volume_tables(cursor, "archive_vol")
+            selected = "SELECT id FROM Memory WHERE substr(timestamp, 1, 4) = ?"
+            #one transaction per year, sqlite commits main and the volume atomically
+            with conn:
+                cursor.execute(f"INSERT INTO archive_vol.Memory SELECT * FROM main.Memory WHERE id IN ({selected})", (year,))
+                count = cursor.rowcount
+                cursor.execute(f"INSERT OR IGNORE INTO archive_vol.MemoryPerson SELECT * FROM main.MemoryPerson WHERE memory_id IN ({selected})", (year,))
+                cursor.execute(f"INSERT OR IGNORE INTO archive_vol.MemoryTag SELECT * FROM main.MemoryTag WHERE memory_id IN ({selected})", (year,))
+                cursor.execute(f"INSERT OR IGNORE INTO archive_vol.MemoryToken SELECT * FROM main.MemoryToken WHERE memory_id IN ({selected})", (year,))
+                for table in ("MemoryPerson", "MemoryTag", "MemoryIndex", "MemoryToken"):
+                    cursor.execute(f"DELETE FROM main.{table} WHERE memory_id IN ({selected})", (year,))
+                cursor.execute(f"DELETE FROM main.Memory WHERE id IN ({selected})", (year,))
+        finally:
+            cursor.execute("DETACH DATABASE archive_vol")
+        moved += count
+        print(f"{year}: {count} memories → {volume_path(year)}")
+
+    print(f"Archived {moved} memories into {len(years)} volume(s).")
+    if input("Shrink the main database now with VACUUM? (Y/n): ").strip().lower() == "y":
+        cursor.execute("VACUUM")
+        print("Done.")
+
+#archive            → list volumes
+#archive YEAR       → move memories dated before YEAR into volumes
+def archive_command(conn, args):
+    args = args.strip()
+    if not args:
+        years = list_volumes()
+        if not years:
+            print("No archive volumes yet. Use 'archive YEAR' to move memories dated before YEAR.")
+            return
+        cursor = conn.cursor()
+        rows = []
+        for group in iter_volume_groups(cursor):
+            for year in group:
+                cursor.execute(f"SELECT COUNT(*) FROM vol_{year}.Memory")
+                rows.append([year, cursor.fetchone()[0], volume_path(year)])
+        render_table(["year", "memories", "file"], sorted(rows), dynamic_columns={"file"})
+    elif re.fullmatch(r"\d{4}", args):
+        archive_memories(conn, args)
+    else:
+        print("Usage: archive [YEAR]")
+
+
+#----------------------------------# SNAPSHOT ANALYTICS #--------------------------------------------------------------------------
+
+#columnar copy of the numbers analytics need, one flat binary file per column, memory-mapped when read
+SNAPSHOT_DIRNAME = "memory_snapshot"
+
+#column → (array typecode, meta key holding its length)
+SNAPSHOT_COLUMNS = {
+    "ids": ("q", "rows"),
+    "months": ("i", "rows"),                #yyyymm of the memory timestamp, 0 if it has none
+    "lengths": ("i", "rows"),               #content length in characters
+    "person_link_person": ("i", "person_links"),
+    "person_link_month": ("i", "person_links"),
+    "tag_link_tag": ("i", "tag_links"),
+    "tag_link_month": ("i", "tag_links"),
+}
+
+MONTH_SQL = """CASE WHEN Memory.timestamp GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]*'
+    THEN CAST(substr(Memory.timestamp, 1, 4) || substr(Memory.timestamp, 6, 2) AS INTEGER) ELSE 0 END"""
+
+LENGTH_BUCKETS = [100, 500, 1000, 5000]    #upper bounds of the content length histogram
+
+#next to the database, read at call time like volume_path so a changed DB_PATH is picked up
+def snapshot_dir():
+    return os.path.join(os.path.dirname(DB_PATH), SNAPSHOT_DIRNAME)
+
+def snapshot_file(name):
+    return os.path.join(snapshot_dir(), f"{name}.bin")
+
+def empty_snapshot_meta():
+    return {"rows": 0, "person_links": 0, "tag_links": 0, "watermark_id": 0}
+
+def load_snapshot_meta():
+    try:
+        with open(os.path.join(snapshot_dir(), "meta.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return empty_snapshot_meta()
+
+#columns shorter than meta says lost data after their meta was saved, appending to them would misalign every row
+def snapshot_damaged(meta):
+    for name, (typecode, count_key) in SNAPSHOT_COLUMNS.items():
+        size = os.path.getsize(snapshot_file(name)) if os.path.exists(snapshot_file(name)) else 0
+        if size < meta[count_key] * array(typecode).itemsize:
+            return True
+    return False
+
+#meta is replaced atomically and written last, so it only ever counts fully written rows
+def save_snapshot_meta(meta):
+    path = os.path.join(snapshot_dir(), "meta.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+#append memories newer than the id watermark, full=True rebuilds from scratch (picks up edits to old memories)
+def refresh_snapshot(cursor, full=False):
+    os.makedirs(snapshot_dir(), exist_ok=True)
+    meta = load_snapshot_meta()
+    if not full and snapshot_damaged(meta):
+        print("Snapshot files are incomplete, rebuilding it.")
+        full = True
+    if full:
+        meta = empty_snapshot_meta()
+        save_snapshot_meta(meta)    #saved before any column is emptied, an interrupted rebuild leaves an empty snapshot
+
+    watermark = meta["watermark_id"]
+    new_rows, person_links, tag_links = [], [], []
+    for _ in iter_volume_groups(cursor):
+        #lengths come from the reindex when it has them, archived memories and ones not reindexed yet are measured here
+        if cipher is None:
+            cursor.execute(f"""
+                SELECT Memory.id, {MONTH_SQL}, COALESCE(MemoryIndex.content_length, length(Memory.content))
+                FROM AllMemory AS Memory LEFT JOIN main.MemoryIndex AS MemoryIndex ON Memory.id = MemoryIndex.memory_id
+                WHERE Memory.id > ?
+            """, (watermark,))
+            new_rows.extend(cursor.fetchall())
+        else:   #encrypted content has to be decrypted for its length, bypassing the cache so a snapshot doesn't evict it
+            cursor.execute(f"""
+                SELECT Memory.id, {MONTH_SQL}, MemoryIndex.content_length, CASE WHEN MemoryIndex.content_length IS NULL THEN Memory.content END
+                FROM AllMemory AS Memory LEFT JOIN main.MemoryIndex AS MemoryIndex ON Memory.id = MemoryIndex.memory_id
+                WHERE Memory.id > ?
+            """, (watermark,))
+            new_rows.extend((mem_id, month, length if length is not None else len(cipher.decrypt_uncached(content, "content") or ""))
+                            for mem_id, month, length, content in cursor.fetchall())
+        cursor.execute(f"""
+            SELECT MemoryPerson.memory_id, MemoryPerson.person_id, {MONTH_SQL}
+            FROM AllMemoryPerson AS MemoryPerson JOIN AllMemory AS Memory ON Memory.id = MemoryPerson.memory_id
+            WHERE MemoryPerson.memory_id > ?
+        """, (watermark,))
+        person_links.extend(cursor.fetchall())
+        cursor.execute(f"""
+            SELECT MemoryTag.memory_id, MemoryTag.tag_id, {MONTH_SQL}
+            FROM AllMemoryTag AS MemoryTag JOIN AllMemory AS Memory ON Memory.id = MemoryTag.memory_id
+            WHERE MemoryTag.memory_id > ?
+        """, (watermark,))
+        tag_links.extend(cursor.fetchall())
+
+    new_rows.sort()
+    person_links.sort()
+    tag_links.sort()
+    appended = {
+        "ids": [row[0] for row in new_rows],
+        "months": [row[1] for row in new_rows],
+        "lengths": [row[2] for row in new_rows],
+        "person_link_person": [link[1] for link in person_links],
+        "person_link_month": [link[2] for link in person_links],
+        "tag_link_tag": [link[1] for link in tag_links],
+        "tag_link_month": [link[2] for link in tag_links],
+    }
+
+    for name, (typecode, count_key) in SNAPSHOT_COLUMNS.items():
+        mode = "r+b" if os.path.exists(snapshot_file(name)) else "wb"
+        with open(snapshot_file(name), mode) as f:
+            f.truncate(meta[count_key] * array(typecode).itemsize)     #only ever shrinks (checked above), drops anything a crashed refresh left past the meta counts
+            f.seek(0, os.SEEK_END)
+            array(typecode, appended[name]).tofile(f)
+
+    meta["rows"] += len(new_rows)
+    meta["person_links"] += len(person_links)
+    meta["tag_links"] += len(tag_links)
+    if new_rows:
+        meta["watermark_id"] = new_rows[-1][0]
+    save_snapshot_meta(meta)
+    print(f"Snapshot: {len(new_rows)} new memories, {meta['rows']} in total (up to id {meta['watermark_id']}).")
+
+#read-only, memory-mapped view of the snapshot columns
+class Snapshot:
+    def __init__(self):
+        self.meta = load_snapshot_meta()
+        self._maps = []
+        self.columns = {}
+        for name, (typecode, count_key) in SNAPSHOT_COLUMNS.items():
+            self.columns[name] = self._map_column(name, typecode, self.meta[count_key])
+
+    def _map_column(self, name, typecode, count):
+        if count == 0:
+            return memoryview(array(typecode))
+        with open(snapshot_file(name), "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return memoryview(mapped)[:count * array(typecode).itemsize].cast(typecode)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def close(self):
+        for column in self.columns.values():
+            column.release()
+        for mapped in self._maps:
+            mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+#aggregations work on whole columns at once (zip/map/Counter run in C), no per-row python code
+def memories_per_month(snapshot):
+    return sorted(Counter(snapshot["months"]).items())
+
+def memories_per_tag_per_month(snapshot):
+    return sorted(Counter(zip(snapshot["tag_link_tag"], snapshot["tag_link_month"])).items(), key=lambda item: (item[0][1], item[0][0]))
+
+def people_frequency(snapshot):
+    return Counter(snapshot["person_link_person"]).most_common()
+
+def length_distribution(snapshot):
+    lengths = snapshot["lengths"]
+    buckets = Counter(map(functools.partial(bisect.bisect_right, LENGTH_BUCKETS), lengths))
+    bounds = [0] + LENGTH_BUCKETS
+    labels = [f"{low}-{high - 1}" for low, high in zip(bounds, LENGTH_BUCKETS)] + [f"{LENGTH_BUCKETS[-1]}+"]
+    return [(label, buckets[index]) for index, label in enumerate(labels)]
+
+def format_month(month):
+    return f"{month // 100}-{month % 100:02d}" if month else "—"
+
+def names_by_id(cursor, table):
+    cursor.execute(f"SELECT id, name FROM {table}")
+    return dict(cursor.fetchall())
+
+#analyze [months | tags | people | lengths], refreshes the snapshot incrementally first
+def analyze_command(cursor, args):
+    report = args.strip() or "months"
+    if report not in ("months", "tags", "people", "lengths"):
+        print("Usage: analyze [months | tags | people | lengths]")
+        return
+
+    refresh_snapshot(cursor)
+    with Snapshot() as snapshot:
+        if report == "months":
+            render_table(["month", "memories"], [[format_month(month), count] for month, count in memories_per_month(snapshot)])
+
+        elif report == "tags":
+            tags = names_by_id(cursor, "Tag")
+            render_table(["month", "tag", "memories"],
+                         [[format_month(month), tags.get(tag_id, tag_id), count] for (tag_id, month), count in memories_per_tag_per_month(snapshot)],
+                         dynamic_columns={"tag"})
+
+        elif report == "people":
+            people = names_by_id(cursor, "Person")
+            render_table(["name", "memories"], [[people.get(person_id, person_id), count] for person_id, count in people_frequency(snapshot)])
+
+        else:
+            lengths = snapshot["lengths"]
+            render_table(["length", "memories"], [list(bucket) for bucket in length_distribution(snapshot)])
+            if len(lengths):
+                ordered = sorted(lengths)
+                print(f"\nmin {ordered[0]} · median {ordered[len(ordered) // 2]} · mean {sum(ordered) / len(ordered):.0f} · max {ordered[-1]}")
+
+
 def main():
-    conn = sqlite3.connect("memory_db.sqlite")
+    conn = connect_db()
     cursor = conn.cursor()
-    cursor.execute("PRAGMA foreign_keys = ON")
 
 
     create_tables(cursor, conn)
+    if not unlock_database(cursor):
+        conn.close()
+        return
     print("\n        Welcome to")
     print("""
           
@@ -784,7 +2068,8 @@ def main():
 
 
     while True:
-        command = input(">>> ").strip().lower()
+        raw_command = input(">>> ").strip()
+        command = raw_command.lower()
 
         if command == "exit":
             print("Goodbye!")
@@ -797,10 +2082,18 @@ Available commands:
   structure          → View all tables and DB structure
   view [table]       → View contents of a table (view Person/Memory/Tag)
   search             → Find stuff based on keywords and view single memory entries
+  live               → Search as you type, results update while you keep typing
   person             → Create or update a Person profile
   memory             → Create or update a Memory
   tag                → Create or update a Tag
   sql                → Open interactive SQL terminal
+  reindex [--jobs N] → Rebuild derived memory data using N worker processes
+  profile on/off     → Start or stop timing queries and hot paths
+  archive [YEAR]     → List archive volumes, or move memories dated before YEAR into yearly volumes
+  snapshot [full]    → Refresh the columnar analytics snapshot (full rebuilds it, picking up edits)
+  analyze [report]   → Memories per month, per tag per month (tags), people frequency (people), content lengths (lengths)
+  encrypt / decrypt  → Encrypt memory titles and content with a passphrase, or store them as plaintext again
+  stats              → Show the slowest queries and hot paths (stats json/pstats FILE to export, stats reset)
   exit               → exits the script
 """)
 
@@ -815,6 +2108,46 @@ Available commands:
         elif command == "sql":
             sql_terminal(cursor, conn)
 
+        elif command == "reindex" or command.startswith("reindex "):
+            try:
+                reindex_memories(conn, jobs=parse_jobs_option(command))
+            except sqlite3.Error as e:
+                print(f"Error: {e}")
+
+        elif command in ("profile on", "profile off"):
+            conn = set_profiling(conn, command == "profile on")
+            cursor = conn.cursor()
+
+        elif command == "archive" or command.startswith("archive "):
+            try:
+                archive_command(conn, command[len("archive"):])
+            except sqlite3.Error as e:
+                print(f"Error: {e}")
+
+        elif command in ("snapshot", "snapshot full"):
+            try:
+                refresh_snapshot(cursor, full=command == "snapshot full")
+            except (OSError, ValueError) as e:
+                print(f"Error: {e}")
+
+        elif command == "analyze" or command.startswith("analyze "):
+            try:
+                analyze_command(cursor, command[len("analyze"):])
+            except (OSError, ValueError) as e:
+                print(f"Error: {e}")
+
+        elif command in ("encrypt", "decrypt"):
+            try:
+                encryption_command(conn, command)
+            except sqlite3.Error as e:
+                print(f"Error: {e}")
+
+        elif command == "stats" or command.startswith("stats "):
+            try:
+                show_stats(raw_command[len("stats"):])
+            except OSError as e:
+                print(f"Error: {e}")
+
         elif command == "person":
             print("\nManage Person Profile")
             get_autocomplete_list("Person", "Person", cursor, conn, is_memory = False)
@@ -830,6 +2163,9 @@ Available commands:
         elif command == "search" :
             main_search_function(cursor, conn)
 
+        elif command == "live" :
+            live_search(cursor, conn)
+
         else:
             print("Unknown command. Type 'help' to see available options.")
 
@@ -837,9 +2173,11 @@ Available commands:
     
 
 ## actually running ## --------------------------------------------------------------------------------------------------------------------
-try:
-    main()
-except Exception as e:
-    print(f"Unexpected error: {type(e).__name__} — {e}")
+#guarded so batch worker processes can import this file without starting the CLI
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"Unexpected error: {type(e).__name__} — {e}")
 
 